@@ -1,149 +1,325 @@
 import os
 import logging
+import queue
 import random
+import re
 import asyncio
+import atexit
+import weakref
 import aiosqlite
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 from dotenv import load_dotenv
 
-# Setup logging
+# Resolve the application directories once; everything else is derived from them
+APP_DIR = Path(__file__).resolve().parent
+BASE_DIR = APP_DIR.parent
+
+# Setup logging: handlers only enqueue records, a background thread writes them
+log_queue = queue.SimpleQueue()
+log_listener = QueueListener(
+    log_queue,
+    RotatingFileHandler(BASE_DIR / 'bot.log', maxBytes=10 * 1024 * 1024, backupCount=3),
+    logging.StreamHandler()
+)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(Path(__file__).parent.parent / 'bot.log'),
-        logging.StreamHandler()
-    ]
+    handlers=[QueueHandler(log_queue)]
 )
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger(__name__)
 
 # Load environment variables before importing constants
-env_path = Path(__file__).parent.parent / '.env'
-logger.info(f"Loading environment variables from: {env_path}")
+env_path = BASE_DIR / '.env'
+logger.info("Loading environment variables from: %s", env_path)
 load_dotenv(env_path)
 
-from telegram import Update, KeyboardButton, ReplyKeyboardMarkup
-from telegram.constants import ParseMode
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram import Chat, InputFile, InputMediaPhoto, Update, KeyboardButton, ReplyKeyboardMarkup
+from telegram.constants import ChatAction, ParseMode
+from telegram.error import BadRequest, TelegramError
+from telegram.ext import AIORateLimiter, Application, CommandHandler, MessageHandler, filters, ContextTypes
 from yandex_gpt import YandexGPTClient
 import json
 import signal
-import atexit
 import fcntl
-from constants import TAROT_CARDS, ADMIN_USER_IDS
+from constants import TELEGRAM_TOKEN, TAROT_CARDS, ADMIN_USER_IDS, ADMIN_USER_ID_SET, DRAMATIC_PAUSES
 from database import Database
 from messages import (
     WELCOME_MESSAGE, READING_START,
-    SECOND_CARD_INTRO, THIRD_CARD_INTRO,
     PAST_CARD, PRESENT_CARD, FUTURE_CARD,
     INTERPRETATION_START, CARDS_SILENT,
-    MYSTICAL_POWERS_UNAVAILABLE, ORACLE_MEDITATION,
-    CLOSING_MESSAGE, ERROR_MESSAGE, get_cooldown_message,
+    MYSTICAL_POWERS_UNAVAILABLE, ORACLE_MEDITATION, TEST_MODE_ACTIVE,
+    CLOSING_MESSAGE, ERROR_MESSAGE, get_cooldown_message, format_minutes,
+    STATS_HEADER, STATS_TOP_USERS_TITLE, STATS_TOP_USER,
+    STATS_TOP_QUESTIONS_TITLE, STATS_TOP_QUESTION,
     escape_html
 )
 
 # Configure paths
-BASE_DIR = Path(__file__).resolve().parent.parent
-CARDS_DIR = (Path(__file__).resolve().parent / "static" / "cards").resolve()
-logger.info(f"Initialized CARDS_DIR as: {CARDS_DIR}")
-logger.info(f"CARDS_DIR exists: {CARDS_DIR.exists()}")
-if CARDS_DIR.exists():
-    logger.info(f"Found card images: {list(CARDS_DIR.glob('*.jpg'))}")
-else:
-    logger.error(f"CARDS_DIR does not exist: {CARDS_DIR}")
+CARDS_DIR = APP_DIR / "static" / "cards"
 LOCK_FILE = BASE_DIR / "bot.lock"
 DB_PATH = BASE_DIR / "data" / "tarot.db"
 
-# Initialize Database
-db = Database(str(DB_PATH))
+def _resolve_card_path(image_filename: str) -> Path:
+    """Resolve a card image filename to an existing absolute path."""
+    image_path = CARDS_DIR / image_filename
+    if not image_path.exists():
+        raise FileNotFoundError(f"Card image file not found: {image_path}")
+    return image_path
+
+# Card names to draw from, built once instead of on every reading
+TAROT_CARD_NAMES = tuple(TAROT_CARDS)
+# Dedicated generator for drawing cards, independent of the shared module-level one
+CARD_RNG = random.Random()
+
+# Position captions for every card, formatted once
+PAST_BY_CARD = {name: PAST_CARD.format(escape_html(name)) for name in TAROT_CARDS}
+PRESENT_BY_CARD = {name: PRESENT_CARD.format(escape_html(name)) for name in TAROT_CARDS}
+FUTURE_BY_CARD = {name: FUTURE_CARD.format(escape_html(name)) for name in TAROT_CARDS}
+
+# Card image contents, filled once at startup by load_card_images()
+CARD_BYTES = {}
+
+# Telegram file_ids of already uploaded cards; re-sending by file_id uploads nothing
+CARD_FILE_ID = {}
+
+# Limit how many readings send their cards at once to stay under Telegram's rate limits;
+# created by init_globals() inside the bot's event loop
+READING_SEMAPHORE = None
+READING_CONCURRENCY = 16
+
+# Per-user locks around the cooldown check; entries disappear once no handler holds them
+USER_LOCKS = weakref.WeakValueDictionary()
+
+def get_user_lock(user_id: int) -> asyncio.Lock:
+    """Get the lock serializing cooldown checks for a user."""
+    lock = USER_LOCKS.get(user_id)
+    if lock is None:
+        lock = USER_LOCKS[user_id] = asyncio.Lock()
+    return lock
+
+# Database; tables are created by init_globals()
+db = Database(str(DB_PATH), pool_size=10, journal_mode='WAL', synchronous='NORMAL')
+
+# YandexGPT client, created by init_globals()
+yandex_gpt = None
+_globals_initialized = False
+
+def load_card_images():
+    """Resolve every card image and keep the (small, fixed) deck in memory so readings don't touch the disk."""
+    logger.info("Initialized CARDS_DIR as: %s", CARDS_DIR)
+    cards_dir_exists = CARDS_DIR.exists()
+    logger.info("CARDS_DIR exists: %s", cards_dir_exists)
+    if not cards_dir_exists:
+        logger.error("CARDS_DIR does not exist: %s", CARDS_DIR)
+    elif logger.isEnabledFor(logging.DEBUG):
+        # Listing the directory is only worth it when someone is debugging
+        logger.debug("Found card images: %s", list(CARDS_DIR.glob('*.jpg')))
+
+    for card_name, image_filename in TAROT_CARDS.items():
+        try:
+            image_path = _resolve_card_path(image_filename)
+        except FileNotFoundError as e:
+            logger.error(str(e))
+            continue
+        CARD_BYTES[card_name] = image_path.read_bytes()
+    logger.info("Resolved %s of %s card images", len(CARD_BYTES), len(TAROT_CARDS))
+    logger.info("Loaded %s bytes of card images into memory", sum(map(len, CARD_BYTES.values())))
+
+async def init_globals():
+    """Do the startup I/O once: load card images, create tables and the YandexGPT client."""
+    global yandex_gpt, READING_SEMAPHORE, _globals_initialized
+    if _globals_initialized:
+        return
 
-# Initialize YandexGPT client
-try:
-    yandex_gpt = YandexGPTClient()
-except Exception as e:
-    logger.error(f"Failed to initialize YandexGPT: {e}")
-    yandex_gpt = None
+    READING_SEMAPHORE = asyncio.Semaphore(READING_CONCURRENCY)
+    await asyncio.to_thread(load_card_images)
+    await db.init()
+
+    try:
+        yandex_gpt = YandexGPTClient()
+    except Exception as e:
+        logger.error("Failed to initialize YandexGPT: %s", e)
+        yandex_gpt = None
+
+    _globals_initialized = True
 
 class BotLock:
     def __init__(self, lock_file):
-        self.lock_file = lock_file
+        self.lock_file = os.fspath(lock_file)
         self.lock_fd = None
 
-    def acquire(self):
+    async def acquire(self):
+        """Take the lock without blocking the event loop on file syscalls."""
+        return await asyncio.to_thread(self._acquire)
+
+    async def release(self):
+        """Release the lock without blocking the event loop on file syscalls."""
+        await asyncio.to_thread(self._release)
+
+    def _acquire(self):
         try:
             # Open or create lock file
-            self.lock_fd = open(self.lock_file, 'w')
-            # Try to acquire exclusive lock
-            fcntl.flock(self.lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
-            self.lock_fd.write(str(os.getpid()))
-            self.lock_fd.flush()
+            self.lock_fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+            # Try to acquire exclusive POSIX record lock (also honoured on NFS)
+            fcntl.lockf(self.lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # Only replace the PID once the lock is ours
+            os.ftruncate(self.lock_fd, 0)
+            os.write(self.lock_fd, str(os.getpid()).encode())
             return True
-        except (IOError, OSError):
-            if self.lock_fd:
-                self.lock_fd.close()
+        except OSError:
+            if self.lock_fd is not None:
+                os.close(self.lock_fd)
+                self.lock_fd = None
             return False
 
-    def release(self):
-        if self.lock_fd:
+    def _release(self):
+        if self.lock_fd is not None:
             try:
-                fcntl.flock(self.lock_fd, fcntl.LOCK_UN)
-                self.lock_fd.close()
-                if os.path.exists(self.lock_file):
-                    os.unlink(self.lock_file)
-            except (IOError, OSError) as e:
-                logging.error(f"Error releasing lock: {e}")
-
-async def send_card_image(update: Update, context: ContextTypes.DEFAULT_TYPE, card_name: str, position: str):
-    """Send a card image followed by its description."""
+                fcntl.lockf(self.lock_fd, fcntl.LOCK_UN)
+                os.close(self.lock_fd)
+                self.lock_fd = None
+                os.unlink(self.lock_file)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.error("Error releasing lock: %s", e)
+
+async def send_card_image(chat: Chat, card_name: str, position: str):
+    """Send a card image with its position as the caption."""
     try:
         # Get the correct image filename from TAROT_CARDS dictionary
-        if card_name not in TAROT_CARDS:
-            logger.error(f"Card name not found in TAROT_CARDS: {card_name}")
-            await context.bot.send_message(
-                chat_id=update.effective_chat.id,
+        image_filename = TAROT_CARDS.get(card_name)
+        if image_filename is None:
+            logger.error("Card name not found in TAROT_CARDS: %s", card_name)
+            await chat.send_message(
                 text=f"{position}\n(Invalid card name)",
                 parse_mode=ParseMode.HTML
             )
             return
-            
-        image_filename = TAROT_CARDS[card_name]
-        logger.info(f"Looking for image file: {image_filename}")
-        
-        image_path = CARDS_DIR / image_filename
-        logger.info(f"Full image path: {image_path}")
-        
-        if not image_path.exists():
-            logger.error(f"Card image file not found: {image_path}")
-            await context.bot.send_message(
-                chat_id=update.effective_chat.id,
+
+        file_id = CARD_FILE_ID.get(card_name)
+        image_bytes = CARD_BYTES.get(card_name)
+        if file_id is None and image_bytes is None:
+            await chat.send_message(
                 text=f"{position}\n(Image file not found)",
                 parse_mode=ParseMode.HTML
             )
             return
 
-        logger.info(f"Sending card image from path: {image_path}")
-        # First send just the image
-        with open(image_path, 'rb') as image_file:
-            await context.bot.send_photo(
-                chat_id=update.effective_chat.id,
-                photo=image_file
+        if file_id is None:
+            # Upload the preloaded bytes; the filename tells Telegram the image type
+            photo = InputFile(image_bytes, filename=image_filename)
+        else:
+            photo = file_id
+
+        logger.debug("Sending card image for: %s", card_name)
+        # The caption carries the description, so a card is a single request
+        try:
+            message = await chat.send_photo(
+                photo=photo,
+                caption=position,
+                parse_mode=ParseMode.HTML
             )
-        
-        # Then send the description
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text=position,
-            parse_mode=ParseMode.HTML
-        )
+        except BadRequest as e:
+            if file_id is None:
+                raise
+            # Telegram rejects file_ids issued to another bot token; forget it and upload the image again
+            logger.warning("Cached file_id for %s was rejected: %s", card_name, e)
+            CARD_FILE_ID.pop(card_name, None)
+            if image_bytes is None:
+                raise
+            file_id = None
+            message = await chat.send_photo(
+                photo=InputFile(image_bytes, filename=image_filename),
+                caption=position,
+                parse_mode=ParseMode.HTML
+            )
+        if file_id is None and message.photo:
+            CARD_FILE_ID[card_name] = message.photo[-1].file_id
     except Exception as e:
-        logger.error(f"Error sending card image: {e}")
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
+        logger.error("Error sending card image: %s", e)
+        await chat.send_message(
             text=f"{position}\n(Error: {str(e)})",
             parse_mode=ParseMode.HTML
         )
 
+async def send_with_pause(chat: Chat, text: str, pause: float):
+    """Send a message and hold a dramatic pause that overlaps with the request."""
+    send = chat.send_message(
+        text=text,
+        parse_mode=ParseMode.HTML
+    )
+    if not DRAMATIC_PAUSES:
+        await send
+        return
+    await asyncio.gather(send, asyncio.sleep(pause))
+
+async def wait_with_typing(chat: Chat, task: asyncio.Task):
+    """Await a task, showing the "typing…" indicator until it finishes."""
+    while not task.done():
+        # Telegram clears the indicator after about 5 seconds, so keep refreshing it
+        try:
+            await chat.send_chat_action(ChatAction.TYPING)
+        except Exception as e:
+            # The indicator is cosmetic; keep waiting for the interpretation
+            logger.debug("Error sending typing action: %s", e)
+        await asyncio.wait({task}, timeout=4)
+    return task.result()
+
+async def send_cards_one_by_one(chat: Chat, cards: list, positions: list):
+    """Send the drawn cards as separate photos; each failure falls back to a text line."""
+    for card_name, position in zip(cards, positions):
+        await send_card_image(chat, card_name, position)
+
+def build_card_media(cards: list, positions: list) -> list:
+    """Build the album for the drawn cards, preferring cached file_ids over uploads."""
+    return [
+        InputMediaPhoto(
+            media=CARD_FILE_ID.get(card_name) or CARD_BYTES[card_name],
+            filename=TAROT_CARDS[card_name],
+            caption=position,
+            parse_mode=ParseMode.HTML
+        )
+        for card_name, position in zip(cards, positions)
+    ]
+
+async def send_card_spread(chat: Chat, cards: list, positions: list):
+    """Send the drawn cards as a single album, each captioned with its position."""
+    if not all(card in CARD_FILE_ID or card in CARD_BYTES for card in cards):
+        # An album can't contain a missing image; fall back to sending cards one by one
+        await send_cards_one_by_one(chat, cards, positions)
+        return
+
+    logger.debug("Sending card spread: %s", cards)
+    try:
+        messages = await chat.send_media_group(media=build_card_media(cards, positions))
+    except BadRequest as e:
+        # Usually a cached file_id issued to another bot token; forget them and upload the images once more
+        logger.warning("Card spread was rejected, uploading the images again: %s", e)
+        for card_name in cards:
+            CARD_FILE_ID.pop(card_name, None)
+        if not all(card in CARD_BYTES for card in cards):
+            await send_cards_one_by_one(chat, cards, positions)
+            return
+        try:
+            messages = await chat.send_media_group(media=build_card_media(cards, positions))
+        except TelegramError as e:
+            logger.error("Error sending card spread, sending cards one by one: %s", e)
+            await send_cards_one_by_one(chat, cards, positions)
+            return
+    except TelegramError as e:
+        logger.error("Error sending card spread, sending cards one by one: %s", e)
+        await send_cards_one_by_one(chat, cards, positions)
+        return
+
+    for card_name, message in zip(cards, messages):
+        if card_name not in CARD_FILE_ID and message.photo:
+            CARD_FILE_ID[card_name] = message.photo[-1].file_id
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a message when the command /start is issued."""
     await update.message.reply_text(
@@ -154,8 +330,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /stats command - show bot statistics (admin only)"""
     user_id = update.effective_user.id
-    logger.info(f"Stats command requested by user {user_id} (type: {type(user_id)})")
-    logger.info(f"Current admin IDs: {ADMIN_USER_IDS} (types: {[type(aid) for aid in ADMIN_USER_IDS]})")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Stats command requested by user %s (type: %s)", user_id, type(user_id))
+        logger.debug("Current admin IDs: %s (types: %s)", ADMIN_USER_IDS, [type(aid) for aid in ADMIN_USER_IDS])
     
     try:
         if not ADMIN_USER_IDS:
@@ -166,15 +343,15 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
             
-        if user_id not in ADMIN_USER_IDS:
-            logger.warning(f"Access denied for user {user_id} - not in admin list {ADMIN_USER_IDS}")
+        if user_id not in ADMIN_USER_ID_SET:
+            logger.warning("Access denied for user %s - not in admin list %s", user_id, ADMIN_USER_IDS)
             await update.message.reply_text(
                 "Эта команда доступна только администраторам бота.",
                 parse_mode=ParseMode.HTML
             )
             return
         
-        logger.info(f"Access granted for admin {user_id}")
+        logger.debug("Access granted for admin %s", user_id)
         # Get days parameter if provided
         try:
             days = int(context.args[0]) if context.args else 7
@@ -190,24 +367,21 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         # Format statistics message
-        message = f"Статистика бота за {stats['period_days']} дней:\n\n"
-        message += f"Всего запросов: {stats['total_requests']}\n"
-        message += f"Уникальных пользователей: {stats['unique_users']}\n"
-        message += f"Успешных запросов: {stats['successful_requests']}\n"
-        message += f"Неудачных запросов: {stats['failed_requests']}\n\n"
+        parts = [STATS_HEADER.format(**stats)]
         
         if stats['top_users']:
-            message += "*Самые активные пользователи:*\n"
-            for username, count in stats['top_users']:
-                message += f"- {username}: {count} запросов\n"
-            message += "\n"
+            parts.append(STATS_TOP_USERS_TITLE)
+            parts.extend(STATS_TOP_USER.format(username, count) for username, count in stats['top_users'])
+            parts.append("")
         
         if stats['top_questions']:
-            message += "*Популярные вопросы:*\n"
+            parts.append(STATS_TOP_QUESTIONS_TITLE)
             for question, count in stats['top_questions']:
                 # Truncate long questions
                 short_q = question[:50] + "..." if len(question) > 50 else question
-                message += f"- {short_q} ({count} раз)\n"
+                parts.append(STATS_TOP_QUESTION.format(short_q, count))
+        
+        message = "\n".join(parts)
         
         await update.message.reply_text(
             message,
@@ -215,7 +389,7 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
     except Exception as e:
-        logger.error(f"Error during stats command: {e}")
+        logger.error("Error during stats command: %s", e)
         await update.message.reply_text(
             "Ошибка при получении статистики.",
             parse_mode=ParseMode.HTML
@@ -224,23 +398,23 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def id_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show user their Telegram ID"""
     user = update.effective_user
-    message = f"Your Telegram info:\nID: {user.id}"
+    parts = ["Your Telegram info:", f"ID: {user.id}"]
     if user.username:
-        message += f"\nUsername: @{user.username}"
+        parts.append(f"Username: @{user.username}")
     if user.first_name:
-        message += f"\nFirst Name: {user.first_name}"
+        parts.append(f"First Name: {user.first_name}")
     if user.last_name:
-        message += f"\nLast Name: {user.last_name}"
+        parts.append(f"Last Name: {user.last_name}")
     
-    await update.message.reply_text(message)
+    await update.message.reply_text("\n".join(parts))
 
 async def set_cooldown_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Set cooldown duration in minutes (admin only)"""
     user_id = update.effective_user.id
-    logger.info(f"Set cooldown command from user {user_id}")
+    logger.info("Set cooldown command from user %s", user_id)
 
-    if user_id not in ADMIN_USER_IDS:
-        logger.warning(f"Unauthorized access attempt to set_cooldown by user {user_id}")
+    if user_id not in ADMIN_USER_ID_SET:
+        logger.warning("Unauthorized access attempt to set_cooldown by user %s", user_id)
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text="У вас нет прав для использования этой команды.",
@@ -270,14 +444,9 @@ async def set_cooldown_command(update: Update, context: ContextTypes.DEFAULT_TYP
 
         # Update cooldown in database
         if await db.set_cooldown_minutes(minutes, user_id):
-            human_readable = (
-                f"{minutes} минут" if minutes >= 5 
-                else f"{minutes} минуты" if 2 <= minutes <= 4 
-                else "минуту"
-            )
             await context.bot.send_message(
                 chat_id=update.effective_chat.id,
-                text=f"Время ожидания между предсказаниями установлено: {human_readable}.",
+                text=f"Время ожидания между предсказаниями установлено: {format_minutes(minutes)}.",
                 parse_mode=ParseMode.HTML
             )
         else:
@@ -288,7 +457,7 @@ async def set_cooldown_command(update: Update, context: ContextTypes.DEFAULT_TYP
             )
 
     except Exception as e:
-        logger.error(f"Error in set_cooldown command: {e}")
+        logger.error("Error in set_cooldown command: %s", e)
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text="Произошла ошибка при обновлении времени ожидания.",
@@ -299,7 +468,7 @@ async def switch_mode_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     """Toggle between test and normal mode."""
     user_id = update.effective_user.id
     
-    if user_id not in ADMIN_USER_IDS:
+    if user_id not in ADMIN_USER_ID_SET:
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text=MYSTICAL_POWERS_UNAVAILABLE,
@@ -318,176 +487,186 @@ async def switch_mode_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         text=f"Режим работы изменен на: {mode_str}",
         parse_mode=ParseMode.HTML
     )
-    logger.info(f"Bot mode changed to: {mode_str} by admin {user_id}")
+    logger.info("Bot mode changed to: %s by admin %s", mode_str, user_id)
+
+# Markdown bold (**text**)
+MARKDOWN_BOLD_RE = re.compile(r'\*\*(.*?)\*\*')
 
 def convert_markdown_to_html(text):
     """Convert markdown bold syntax to HTML bold tags."""
-    import re
     # Replace markdown bold (**text**) with HTML bold (<b>text</b>)
-    return re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', text)
+    return MARKDOWN_BOLD_RE.sub(r'<b>\1</b>', text)
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle incoming messages and perform tarot reading."""
-    user_id = update.effective_user.id
-    username = update.effective_user.username or "No username"
+    user = update.effective_user
+    user_id = user.id
+    username = user.username or "No username"
     question = update.message.text
+    chat = update.effective_chat
     
-    logger.info(f"Received message from user {user_id} (@{username}): {question}")
+    logger.debug("Received message from user %s (@%s): %s", user_id, username, question)
+    requested_at = None
+    # Set once the request is logged, so a failing error reply doesn't log it again
+    recorded = False
 
     try:
-        # Check cooldown
-        logger.info(f"Checking cooldown for user {user_id} (@{username})")
-        is_cooldown, remaining_minutes = await db.is_on_cooldown(user_id)
+        # Check and start the cooldown under the user's lock so two messages can't both pass
+        async with get_user_lock(user_id):
+            logger.debug("Checking cooldown for user %s (@%s)", user_id, username)
+            is_cooldown, remaining_minutes = await db.is_on_cooldown(user_id)
+            if not is_cooldown:
+                # Start the cooldown now; it is stored together with the request log
+                logger.debug("Updating last request time for user %s (@%s)", user_id, username)
+                requested_at = db.mark_request(user_id)
+
         if is_cooldown:
-            logger.info(f"User {user_id} (@{username}) is on cooldown, {remaining_minutes} minutes remaining")
-            await context.bot.send_message(
-                chat_id=update.effective_chat.id,
+            logger.debug("User %s (@%s) is on cooldown, %s minutes remaining", user_id, username, remaining_minutes)
+            await chat.send_message(
                 text=get_cooldown_message(remaining_minutes),
                 parse_mode=ParseMode.HTML
             )
             return
 
-        # Update last request time
-        logger.info(f"Updating last request time for user {user_id} (@{username})")
-        await db.update_last_request(user_id)
-
         # Draw cards
         try:
-            logger.info(f"Drawing cards from TAROT_CARDS for user {user_id} (@{username})")
-            cards = random.sample(list(TAROT_CARDS.keys()), 3)
-            logger.info(f"Successfully drew cards for user {user_id} (@{username}): {cards}")
+            logger.debug("Drawing cards from TAROT_CARDS for user %s (@%s)", user_id, username)
+            cards = CARD_RNG.sample(TAROT_CARD_NAMES, 3)
+            logger.debug("Successfully drew cards for user %s (@%s): %s", user_id, username, cards)
         except Exception as e:
-            logger.error(f"Error drawing cards for user {user_id} (@{username}): {e}")
+            logger.error("Error drawing cards for user %s (@%s): %s", user_id, username, e)
             raise
+
+        # Check test mode only for admin users
+        is_test = await db.is_test_mode() and user_id in ADMIN_USER_ID_SET
+
+        # Start the interpretation now so it is generated while the cards are revealed
+        interpretation_task = None
+        if not is_test and yandex_gpt:
+            interpretation_task = asyncio.create_task(yandex_gpt.generate_interpretation(cards, question))
         
         try:
             # Send initial message
-            await context.bot.send_message(
-                chat_id=update.effective_chat.id,
-                text=READING_START,
-                parse_mode=ParseMode.HTML
-            )
-            await asyncio.sleep(2)
-            
-            # Send first card
-            first_card_text = PAST_CARD.format(escape_html(cards[0]))
-            await send_card_image(update, context, cards[0], first_card_text)
-            await asyncio.sleep(2)
-            
-            # Send second card
-            await context.bot.send_message(
-                chat_id=update.effective_chat.id,
-                text=SECOND_CARD_INTRO,
-                parse_mode=ParseMode.HTML
-            )
-            await asyncio.sleep(1)
-            second_card_text = PRESENT_CARD.format(escape_html(cards[1]))
-            await send_card_image(update, context, cards[1], second_card_text)
-            await asyncio.sleep(2)
-            
-            # Send third card
-            await context.bot.send_message(
-                chat_id=update.effective_chat.id,
-                text=THIRD_CARD_INTRO,
-                parse_mode=ParseMode.HTML
-            )
-            await asyncio.sleep(1)
-            third_card_text = FUTURE_CARD.format(escape_html(cards[2]))
-            await send_card_image(update, context, cards[2], third_card_text)
-            await asyncio.sleep(2)
+            await send_with_pause(chat, READING_START, 2)
+
+            # Send the cards in one request
+            async with READING_SEMAPHORE:
+                await send_card_spread(chat, cards, [
+                    PAST_BY_CARD[cards[0]],
+                    PRESENT_BY_CARD[cards[1]],
+                    FUTURE_BY_CARD[cards[2]]
+                ])
             
             try:
-                await context.bot.send_message(
-                    chat_id=update.effective_chat.id,
-                    text=INTERPRETATION_START,
-                    parse_mode=ParseMode.HTML
-                )
-                await asyncio.sleep(3)
-                
-                # Check test mode only for admin users
-                is_test = await db.is_test_mode() and user_id in ADMIN_USER_IDS
+                await send_with_pause(chat, INTERPRETATION_START, 3)
                 
                 if is_test:
-                    logger.info(f"Test mode active for admin {user_id} (@{username}), skipping YandexGPT request")
-                    await context.bot.send_message(
-                        chat_id=update.effective_chat.id,
-                        text="Тестовый режим активен. Интерпретация карт отключена.",
+                    logger.info("Test mode active for admin %s (@%s), skipping YandexGPT request", user_id, username)
+                    await db.update_last_request(user_id)
+                    await chat.send_message(
+                        text=TEST_MODE_ACTIVE,
                         parse_mode=ParseMode.HTML
                     )
                 else:
-                    response = await yandex_gpt.generate_interpretation(cards, question)
+                    if interpretation_task is None:
+                        raise RuntimeError("YandexGPT client is not initialized")
+                    response = await wait_with_typing(chat, interpretation_task)
+                    # Escape special characters in the response
+                    interpretation = convert_markdown_to_html(escape_html(response if response else CARDS_SILENT))
+                    await chat.send_message(
+                        text=interpretation,
+                        parse_mode=ParseMode.HTML
+                    )
                     # Log successful request
-                    await db.log_request(
+                    await db.record_reading(
                         user_id=user_id,
                         username=username,
                         question=question,
                         cards=cards,
-                        success=True
-                    )
-                    logger.info(f"Successful request from user {user_id} (@{username}) with question: {question}")
-                    # Escape special characters in the response
-                    interpretation = convert_markdown_to_html(escape_html(response if response else CARDS_SILENT))
-                    await context.bot.send_message(
-                        chat_id=update.effective_chat.id,
-                        text=interpretation,
-                        parse_mode=ParseMode.HTML
+                        success=True,
+                        requested_at=requested_at
                     )
+                    recorded = True
+                    logger.debug("Successful request from user %s (@%s) with question: %s", user_id, username, question)
             except Exception as e:
-                logger.error(f"Error handling message for user {user_id} (@{username}): {e}")
-                await context.bot.send_message(
-                    chat_id=update.effective_chat.id,
+                logger.error("Error handling message for user %s (@%s): %s", user_id, username, e)
+                # Log failed request
+                await db.record_reading(
+                    user_id=user_id,
+                    username=username,
+                    question=question,
+                    cards=cards,
+                    success=False,
+                    requested_at=requested_at
+                )
+                recorded = True
+                await chat.send_message(
                     text=MYSTICAL_POWERS_UNAVAILABLE,
                     parse_mode=ParseMode.HTML
                 )
         except Exception as e:
-            logger.error(f"Error handling message for user {user_id} (@{username}): {e}")
+            logger.error("Error handling message for user %s (@%s): %s", user_id, username, e)
+            if not recorded:
+                # Log failed request
+                await db.record_reading(
+                    user_id=user_id,
+                    username=username,
+                    question=question,
+                    cards=[],
+                    success=False,
+                    requested_at=requested_at
+                )
+                recorded = True
+            await chat.send_message(
+                text=ERROR_MESSAGE,
+                parse_mode=ParseMode.HTML
+            )
+        finally:
+            # Don't leave the interpretation running if the reading was aborted
+            if interpretation_task:
+                interpretation_task.cancel()
+
+    except Exception as e:
+        logger.error("Error handling message for user %s (@%s): %s", user_id, username, e)
+        if not recorded:
             # Log failed request
-            await db.log_request(
+            await db.record_reading(
                 user_id=user_id,
                 username=username,
                 question=question,
                 cards=[],
-                success=False
-            )
-            await context.bot.send_message(
-                chat_id=update.effective_chat.id,
-                text=ERROR_MESSAGE,
-                parse_mode=ParseMode.HTML
+                success=False,
+                requested_at=requested_at
             )
-
-    except Exception as e:
-        logger.error(f"Error handling message for user {user_id} (@{username}): {e}")
-        # Log failed request
-        await db.log_request(
-            user_id=user_id,
-            username=username,
-            question=question,
-            cards=[],
-            success=False
-        )
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
+        await chat.send_message(
             text=ERROR_MESSAGE,
             parse_mode=ParseMode.HTML
         )
 
-async def cleanup():
+async def cleanup(bot_lock: BotLock = None):
     """Cleanup resources before shutdown."""
     logger.info("Starting cleanup...")
     try:
+        # Persist uploaded card file_ids for the next run
+        await db.save_card_file_ids(CARD_FILE_ID)
+
         # Close database connection
         await db.close()
         logger.info("Database connection closed")
+
+        # Stop YandexGPT worker threads
+        if yandex_gpt:
+            yandex_gpt.close()
         
         # Release bot lock
         if bot_lock:
-            bot_lock.release()
+            await bot_lock.release()
             logger.info("Bot lock released")
             
         # Additional cleanup tasks can be added here
         
     except Exception as e:
-        logger.error(f"Error during cleanup: {e}")
+        logger.error("Error during cleanup: %s", e)
     finally:
         logger.info("Cleanup completed")
 
@@ -495,13 +674,50 @@ class TarotBot:
     def __init__(self):
         self.application = None
         self.running = False
+        self.bot_lock = None
+        # Created in start(): on Python < 3.10 an Event binds to the loop current at creation
+        self._stop_event = None
         
     async def initialize(self):
         """Initialize bot components."""
         if self.application:
             return
 
-        self.application = Application.builder().token(os.getenv('TELEGRAM_TOKEN')).build()
+        # Load cards, create tables and the YandexGPT client
+        await init_globals()
+
+        # Keep enough pooled HTTP/2 connections to Telegram for concurrent readings,
+        # and let PTB queue and retry requests that hit the flood limits
+        self.application = (
+            Application.builder()
+            .token(TELEGRAM_TOKEN)
+            .connection_pool_size(32)
+            .pool_timeout(30)
+            .connect_timeout(5)
+            .read_timeout(20)
+            .write_timeout(20)
+            .http_version("2")
+            .get_updates_connection_pool_size(8)
+            .get_updates_pool_timeout(30)
+            # A reading takes several seconds of pauses; don't make other users wait for it
+            .concurrent_updates(True)
+            .rate_limiter(AIORateLimiter(
+                overall_max_rate=30,
+                overall_time_period=1,
+                group_max_rate=20,
+                group_time_period=60,
+                # Wait out RetryAfter flood errors instead of failing the reading
+                max_retries=3
+            ))
+            .build()
+        )
+
+        # Write request logs in batches in the background
+        db.start_log_flusher()
+
+        # Reuse card uploads from previous runs
+        CARD_FILE_ID.update(await db.get_card_file_ids())
+        logger.info("Loaded %s cached card file_ids", len(CARD_FILE_ID))
         
         # Initialize handlers
         self.application.add_handler(CommandHandler("start", start))
@@ -514,50 +730,50 @@ class TarotBot:
     async def start(self):
         """Start the bot."""
         logger.info("Starting bot...")
+        self._stop_event = asyncio.Event()
         
         # Try to acquire lock
-        global bot_lock
-        bot_lock = BotLock(LOCK_FILE)
-        if not bot_lock.acquire():
+        self.bot_lock = BotLock(LOCK_FILE)
+        if not await self.bot_lock.acquire():
             logger.error("Another instance of the bot is already running")
             return
 
         try:
             await self.initialize()
+
+            # Stop cooperatively on SIGINT/SIGTERM so cleanup() runs on this loop
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, self._stop_event.set)
             
             # Start the Bot
             logger.info("Starting bot polling...")
             self.running = True
             
-            # Create a new event loop for the polling
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
             try:
                 await self.application.initialize()
                 await self.application.start()
                 await self.application.updater.start_polling()
                 
-                # Keep the bot running
-                while self.running:
-                    await asyncio.sleep(1)
+                # Keep the bot running until stop() is requested
+                await self._stop_event.wait()
                     
             except Exception as e:
-                logger.error(f"Error during bot operation: {e}", exc_info=True)
+                logger.error("Error during bot operation: %s", e, exc_info=True)
                 self.running = False
             finally:
                 await self.application.updater.stop()
                 await self.application.stop()
-                loop.stop()
-                loop.close()
                 
         except Exception as e:
-            logger.error(f"Critical error: {e}", exc_info=True)
+            logger.error("Critical error: %s", e, exc_info=True)
         finally:
             await self.stop()
             
     async def stop(self):
         """Stop the bot and cleanup resources."""
+        if self._stop_event:
+            self._stop_event.set()
         if self.running:
             logger.info("Stopping bot...")
             try:
@@ -565,14 +781,15 @@ class TarotBot:
                 if self.application:
                     if self.application.updater and self.application.updater.running:
                         await self.application.updater.stop()
-                    await self.application.stop()
-                await cleanup()
+                    if self.application.running:
+                        await self.application.stop()
+                await cleanup(self.bot_lock)
                 logger.info("Bot stopped successfully")
             except Exception as e:
-                logger.error(f"Error during cleanup: {e}")
+                logger.error("Error during cleanup: %s", e)
             finally:
-                if bot_lock:
-                    bot_lock.release()
+                if self.bot_lock:
+                    await self.bot_lock.release()
 
 def run_bot():
     """Run the bot with proper asyncio handling."""
@@ -584,16 +801,23 @@ def run_bot():
         except KeyboardInterrupt:
             logger.info("Bot stopped by user")
         except Exception as e:
-            logger.error(f"Bot crashed: {e}", exc_info=True)
+            logger.error("Bot crashed: %s", e, exc_info=True)
         finally:
             await bot.stop()
     
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        logger.info("Using uvloop event loop")
+    except ImportError:
+        logger.info("uvloop not installed, using default asyncio event loop")
+
     try:
         asyncio.run(_run())
     except KeyboardInterrupt:
         logger.info("Bot stopped by keyboard interrupt")
     except Exception as e:
-        logger.error(f"Fatal error: {e}", exc_info=True)
+        logger.error("Fatal error: %s", e, exc_info=True)
 
 if __name__ == '__main__':
     run_bot()
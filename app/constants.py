@@ -24,8 +24,12 @@ def parse_admin_ids():
 # Bot configuration
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 ADMIN_USER_IDS = parse_admin_ids()
+ADMIN_USER_ID_SET = frozenset(ADMIN_USER_IDS)  # For O(1) admin checks
 logger.info(f"Initialized ADMIN_USER_IDS: {ADMIN_USER_IDS}")
 
+# Pause between reading messages for effect; rate limiting is handled by PTB's AIORateLimiter
+DRAMATIC_PAUSES = os.getenv('DRAMATIC_PAUSES', 'true').lower() != 'false'
+
 # Mapping of card names to their image files
 TAROT_CARDS = {
     # Старшие арканы (22)
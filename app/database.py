@@ -1,27 +1,220 @@
 import aiosqlite
 import asyncio
 import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of users whose last request time is kept in memory
+LAST_REQUEST_CACHE_SIZE = 100_000
+
+# How long bot settings are served from memory before being re-read, in seconds
+SETTINGS_CACHE_TTL = 30
+
+UPSERT_LAST_REQUEST = '''
+    INSERT INTO user_cooldowns (user_id, last_request)
+    VALUES (?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+    last_request = excluded.last_request
+'''
+
+INSERT_REQUEST_LOG = '''
+    INSERT INTO request_log (user_id, username, question, cards, timestamp, success)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+# Request log rows are written in batches of up to this many rows...
+LOG_BATCH_SIZE = 50
+# ...or after this many seconds, whichever comes first
+LOG_FLUSH_INTERVAL = 0.5
+
+# How often a write is retried when another process holds the database lock
+WRITE_RETRIES = 3
+WRITE_RETRY_DELAY = 0.1  # seconds, doubled on every attempt
+
 class Database:
-    def __init__(self, db_path: str = "tarot.db"):
+    def __init__(self, db_path: str = "tarot.db", pool_size: int = 5,
+                 journal_mode: str = "WAL", synchronous: str = "NORMAL", busy_timeout: int = 30000):
         """Initialize database connection"""
         self.db_path = db_path
-        self._ensure_db_dir()
-        asyncio.run(self.init())  # Initialize tables when creating database object
+        self.pool_size = pool_size
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        # Queue of pooled read connections, created lazily inside the bot's event loop
+        self._pool = None
+        # Single write connection; SQLite allows one writer at a time anyway
+        self._writer = None
+        self._write_lock = None
+        # Pending request log writes, each a tuple of (sql, params) statements;
+        # created by init() inside the bot's event loop, like the pool
+        self._log_queue = None
+        self._log_flusher_task = None
+        # user_id -> last request datetime (None if the user has no requests yet)
+        self._last_request_cache = OrderedDict()
+        # setting key -> (value, monotonic expiry time)
+        self._settings_cache = {}
+        self._initialized = False
 
     def _ensure_db_dir(self):
         """Ensure the database directory exists"""
         db_dir = Path(self.db_path).parent
         db_dir.mkdir(parents=True, exist_ok=True)
 
+    async def _connect(self) -> aiosqlite.Connection:
+        """Open a new connection with the configured pragmas"""
+        conn = await aiosqlite.connect(self.db_path)
+        await conn.execute(f'PRAGMA journal_mode={self.journal_mode}')
+        await conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        await conn.execute(f'PRAGMA busy_timeout={self.busy_timeout}')
+        await conn.execute('PRAGMA temp_store=MEMORY')
+        await conn.execute('PRAGMA cache_size=-64000')  # 64 MB page cache
+        await conn.execute('PRAGMA mmap_size=268435456')  # Read pages through a 256 MB memory map
+        return conn
+
+    @asynccontextmanager
+    async def _read_connection(self):
+        """Borrow a read connection from the pool, opening it on first use"""
+        if self._pool is None:
+            self._pool = asyncio.Queue()
+            for _ in range(self.pool_size):
+                self._pool.put_nowait(None)
+
+        conn = await self._pool.get()
+        try:
+            if conn is None:
+                conn = await self._connect()
+            yield conn
+        except Exception:
+            # Don't hand out a connection with a half-done transaction
+            if conn is not None:
+                await conn.rollback()
+            raise
+        finally:
+            self._pool.put_nowait(conn)
+
+    @asynccontextmanager
+    async def _write_connection(self):
+        """Hold the write connection exclusively, opening it on first use"""
+        async with self._write_lock:
+            if self._writer is None:
+                self._writer = await self._connect()
+            try:
+                yield self._writer
+            except Exception:
+                await self._writer.rollback()
+                raise
+
+    async def _write(self, *statements):
+        """Execute (sql, params) statements in one transaction on the write connection.
+
+        Retries with a growing delay while another process holds the database lock.
+        """
+        for attempt in range(WRITE_RETRIES):
+            try:
+                async with self._write_connection() as db:
+                    for sql, params in statements:
+                        await db.execute(sql, params)
+                    await db.commit()
+                return
+            except sqlite3.OperationalError as e:
+                if 'database is locked' not in str(e) or attempt == WRITE_RETRIES - 1:
+                    raise
+                logger.warning(f"Database is locked, retrying write (attempt {attempt + 1})")
+                await asyncio.sleep(WRITE_RETRY_DELAY * 2 ** attempt)
+
+    def start_log_flusher(self):
+        """Start writing queued request log entries in the background"""
+        if self._log_flusher_task is None:
+            self._log_flusher_task = asyncio.create_task(self._flush_log_queue())
+
+    async def _flush_log_queue(self):
+        """Write queued log entries in batches until a None sentinel is received"""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch = []
+            entry = await self._log_queue.get()
+            deadline = loop.time() + LOG_FLUSH_INTERVAL
+            while entry is not None:
+                batch.append(entry)
+                timeout = deadline - loop.time()
+                if len(batch) >= LOG_BATCH_SIZE or timeout <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self._log_queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            stopping = entry is None
+            await self._write_log_batch(batch)
+
+    async def _write_log_batch(self, batch: list):
+        """Write a batch of queued log entries in one transaction"""
+        if not batch:
+            return
+        try:
+            await self._write(*(statement for entry in batch for statement in entry))
+        except Exception as e:
+            logger.error(f"Error writing {len(batch)} request log entries: {e}")
+
+    async def _get_setting(self, key: str):
+        """Get a bot setting value, cached for SETTINGS_CACHE_TTL seconds"""
+        now = time.monotonic()
+        cached = self._settings_cache.get(key)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+
+        async with self._read_connection() as db:
+            async with db.execute(
+                'SELECT value FROM bot_settings WHERE key = ?',
+                (key,)
+            ) as cursor:
+                row = await cursor.fetchone()
+
+        value = row[0] if row else None
+        self._settings_cache[key] = (value, now + SETTINGS_CACHE_TTL)
+        return value
+
+    def _cache_last_request(self, user_id: int, last_request):
+        """Remember user's last request time, evicting the least recently used entry"""
+        self._last_request_cache[user_id] = last_request
+        self._last_request_cache.move_to_end(user_id)
+        if len(self._last_request_cache) > LAST_REQUEST_CACHE_SIZE:
+            self._last_request_cache.popitem(last=False)
+
+    async def _get_last_request(self, user_id: int):
+        """Get user's last request time, from the cache when possible"""
+        if user_id in self._last_request_cache:
+            self._last_request_cache.move_to_end(user_id)
+            return self._last_request_cache[user_id]
+
+        async with self._read_connection() as db:
+            async with db.execute(
+                'SELECT last_request FROM user_cooldowns WHERE user_id = ?',
+                (user_id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+
+        last_request = datetime.fromisoformat(row[0]) if row else None
+        self._cache_last_request(user_id, last_request)
+        return last_request
+
     async def init(self):
-        """Initialize database tables"""
+        """Initialize database tables (only once per instance)"""
+        if self._initialized:
+            return
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+            self._log_queue = asyncio.Queue()
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            self._ensure_db_dir()
+            db = await self._connect()
+            try:
                 # Create bot_settings table with additional columns
                 await db.execute('''
                     CREATE TABLE IF NOT EXISTS bot_settings (
@@ -63,6 +256,19 @@ class Database:
                         success BOOLEAN NOT NULL
                     )
                 ''')
+
+                # Stats filter request_log by time window
+                await db.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_request_log_timestamp_user
+                    ON request_log (timestamp, user_id)
+                ''')
+                
+                await db.execute('''
+                    CREATE TABLE IF NOT EXISTS card_file_ids (
+                        card_name TEXT PRIMARY KEY,
+                        file_id TEXT NOT NULL
+                    )
+                ''')
                 
                 # Set default cooldown if not exists
                 await db.execute(
@@ -77,7 +283,10 @@ class Database:
                 )
                 
                 await db.commit()
+                self._initialized = True
                 logger.info("Database initialized successfully")
+            finally:
+                await db.close()
         except Exception as e:
             logger.error(f"Error initializing database: {e}")
             raise
@@ -85,15 +294,10 @@ class Database:
     async def get_cooldown_minutes(self) -> int:
         """Get current cooldown setting in minutes"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                async with db.execute(
-                    'SELECT value FROM bot_settings WHERE key = ?',
-                    ('cooldown_minutes',)
-                ) as cursor:
-                    row = await cursor.fetchone()
-                    if row:
-                        return int(row[0])
-                    return 1440  # Default: 24 hours = 1440 minutes
+            value = await self._get_setting('cooldown_minutes')
+            if value is not None:
+                return int(value)
+            return 1440  # Default: 24 hours = 1440 minutes
         except Exception as e:
             logger.error(f"Error getting cooldown setting: {e}")
             return 1440  # Default on error
@@ -101,16 +305,15 @@ class Database:
     async def set_cooldown_minutes(self, minutes: int, updated_by: int) -> bool:
         """Set cooldown in minutes"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute(
-                    '''INSERT OR REPLACE INTO bot_settings 
-                       (key, value, updated_at, updated_by) 
-                       VALUES (?, ?, CURRENT_TIMESTAMP, ?)''',
-                    ('cooldown_minutes', str(minutes), updated_by)
-                )
-                await db.commit()
-                logger.info(f"Cooldown set to {minutes} minutes by user {updated_by}")
-                return True
+            await self._write((
+                '''INSERT OR REPLACE INTO bot_settings 
+                   (key, value, updated_at, updated_by) 
+                   VALUES (?, ?, CURRENT_TIMESTAMP, ?)''',
+                ('cooldown_minutes', str(minutes), updated_by)
+            ))
+            self._settings_cache.pop('cooldown_minutes', None)
+            logger.info(f"Cooldown set to {minutes} minutes by user {updated_by}")
+            return True
         except Exception as e:
             logger.error(f"Error setting cooldown: {e}")
             return False
@@ -121,25 +324,19 @@ class Database:
             cooldown_minutes = await self.get_cooldown_minutes()
             cooldown_seconds = cooldown_minutes * 60
             
-            async with aiosqlite.connect(self.db_path) as db:
-                async with db.execute(
-                    'SELECT last_request FROM user_cooldowns WHERE user_id = ?',
-                    (user_id,)
-                ) as cursor:
-                    row = await cursor.fetchone()
-                    if not row:
-                        return 0
-
-                    last_request = datetime.fromisoformat(row[0])
-                    time_diff = (datetime.now() - last_request).total_seconds()
-                    remaining_seconds = cooldown_seconds - time_diff
-                    
-                    if remaining_seconds <= 0:
-                        return 0
-                    
-                    # Round up to the nearest minute if less than a minute remains
-                    remaining_minutes = max(1, int((remaining_seconds + 59) // 60))
-                    return remaining_minutes
+            last_request = await self._get_last_request(user_id)
+            if last_request is None:
+                return 0
+
+            time_diff = (datetime.now() - last_request).total_seconds()
+            remaining_seconds = cooldown_seconds - time_diff
+            
+            if remaining_seconds <= 0:
+                return 0
+            
+            # Round up to the nearest minute if less than a minute remains
+            remaining_minutes = max(1, int((remaining_seconds + 59) // 60))
+            return remaining_minutes
 
         except Exception as e:
             logger.error(f"Error checking remaining cooldown: {e}")
@@ -158,78 +355,106 @@ class Database:
     async def update_last_request(self, user_id: int):
         """Update user's last request timestamp"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute('''
-                    INSERT INTO user_cooldowns (user_id, last_request)
-                    VALUES (?, ?)
-                    ON CONFLICT(user_id) DO UPDATE SET
-                    last_request = excluded.last_request
-                ''', (user_id, datetime.now().isoformat()))
-                await db.commit()
+            now = datetime.now()
+            await self._write((UPSERT_LAST_REQUEST, (user_id, now.isoformat())))
+            self._cache_last_request(user_id, now)
                 
         except Exception as e:
             logger.error(f"Error updating last request: {e}")
 
+    def mark_request(self, user_id: int) -> datetime:
+        """Start user's cooldown in memory; it is persisted by record_reading"""
+        now = datetime.now()
+        self._cache_last_request(user_id, now)
+        return now
+
+    async def record_reading(self, user_id: int, username: str, question: str, cards: list, success: bool,
+                             requested_at: datetime = None):
+        """Queue user's last request timestamp and the reading log to be written together.
+
+        Without requested_at no cooldown was started, so only the request is logged.
+        """
+        if requested_at is None:
+            await self.log_request(user_id, username, question, cards, success)
+            return
+        try:
+            self._log_queue.put_nowait((
+                (UPSERT_LAST_REQUEST, (user_id, requested_at.isoformat())),
+                (INSERT_REQUEST_LOG, (user_id, username, question, ','.join(cards), datetime.now().isoformat(), success))
+            ))
+            self._cache_last_request(user_id, requested_at)
+        except Exception as e:
+            logger.error(f"Error recording reading: {e}")
+
     async def log_request(self, user_id: int, username: str, question: str, cards: list, success: bool):
-        """Log a tarot request"""
+        """Queue a tarot request to be logged"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute('''
-                    INSERT INTO request_log (user_id, username, question, cards, timestamp, success)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (user_id, username, question, ','.join(cards), datetime.now().isoformat(), success))
-                await db.commit()
+            self._log_queue.put_nowait((
+                (INSERT_REQUEST_LOG, (user_id, username, question, ','.join(cards), datetime.now().isoformat(), success)),
+            ))
         except Exception as e:
             logger.error(f"Error logging request: {e}")
 
     async def get_user_stats(self, days: int = 7) -> dict:
         """Get statistics for the last N days"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
+            async with self._read_connection() as db:
                 cutoff_time = (datetime.now() - timedelta(days=days)).isoformat()
                 
-                # Total requests
-                cursor = await db.execute('''
-                    SELECT COUNT(*) as total,
-                           COUNT(DISTINCT user_id) as unique_users,
-                           SUM(CASE WHEN success THEN 1 ELSE 0 END) as successful,
-                           SUM(CASE WHEN NOT success THEN 1 ELSE 0 END) as failed
-                    FROM request_log
-                    WHERE timestamp > ?
-                ''', (cutoff_time,))
-                stats = await cursor.fetchone()
-                
-                # Most active users
+                # Totals, most active users and most common questions in one query
                 cursor = await db.execute('''
-                    SELECT username, COUNT(*) as request_count
-                    FROM request_log
-                    WHERE timestamp > ? AND username IS NOT NULL
-                    GROUP BY username
-                    ORDER BY request_count DESC
-                    LIMIT 5
-                ''', (cutoff_time,))
-                top_users = await cursor.fetchall()
-                
-                # Most common questions (keywords)
-                cursor = await db.execute('''
-                    SELECT question, COUNT(*) as count
-                    FROM request_log
-                    WHERE timestamp > ?
-                    GROUP BY question
-                    ORDER BY count DESC
-                    LIMIT 5
+                    WITH recent AS (
+                        SELECT user_id, username, question, success
+                        FROM request_log
+                        WHERE timestamp > ?
+                    ),
+                    totals AS (
+                        SELECT COUNT(*) as total,
+                               COUNT(DISTINCT user_id) as unique_users,
+                               SUM(CASE WHEN success THEN 1 ELSE 0 END) as successful,
+                               SUM(CASE WHEN NOT success THEN 1 ELSE 0 END) as failed
+                        FROM recent
+                    ),
+                    top_users AS (
+                        SELECT username, COUNT(*) as request_count
+                        FROM recent
+                        WHERE username IS NOT NULL
+                        GROUP BY username
+                        ORDER BY request_count DESC
+                        LIMIT 5
+                    ),
+                    top_questions AS (
+                        SELECT question, COUNT(*) as count
+                        FROM recent
+                        GROUP BY question
+                        ORDER BY count DESC
+                        LIMIT 5
+                    )
+                    SELECT 'totals' as kind, NULL as label, total as count, unique_users, successful, failed
+                    FROM totals
+                    UNION ALL
+                    SELECT 'user', username, request_count, NULL, NULL, NULL FROM top_users
+                    UNION ALL
+                    SELECT 'question', question, count, NULL, NULL, NULL FROM top_questions
                 ''', (cutoff_time,))
-                top_questions = await cursor.fetchall()
-                
+                cursor.row_factory = aiosqlite.Row
+                rows = await cursor.fetchall()
+
+                stats = next(row for row in rows if row['kind'] == 'totals')
+                # UNION ALL doesn't guarantee order, so rank the top lists here
+                top_users = sorted((row for row in rows if row['kind'] == 'user'),
+                                   key=lambda row: row['count'], reverse=True)
+                top_questions = sorted((row for row in rows if row['kind'] == 'question'),
+                                       key=lambda row: row['count'], reverse=True)
+
                 return {
                     "period_days": days,
-                    "total_requests": stats['total'],
+                    "total_requests": stats['count'],
                     "unique_users": stats['unique_users'],
                     "successful_requests": stats['successful'],
                     "failed_requests": stats['failed'],
-                    "top_users": [(row['username'], row['request_count']) for row in top_users],
-                    "top_questions": [(row['question'], row['count']) for row in top_questions]
+                    "top_users": [(row['label'], row['count']) for row in top_users],
+                    "top_questions": [(row['label'], row['count']) for row in top_questions]
                 }
                 
         except Exception as e:
@@ -239,17 +464,12 @@ class Database:
     async def cleanup_old_records(self, hours: int = 24):
         """Remove records older than specified hours"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                cutoff_time = (datetime.now() - timedelta(hours=hours)).isoformat()
-                await db.execute(
-                    'DELETE FROM user_cooldowns WHERE last_request < ?',
-                    (cutoff_time,)
-                )
-                await db.execute(
-                    'DELETE FROM request_log WHERE timestamp < ?',
-                    (cutoff_time,)
-                )
-                await db.commit()
+            cutoff_time = (datetime.now() - timedelta(hours=hours)).isoformat()
+            await self._write(
+                ('DELETE FROM user_cooldowns WHERE last_request < ?', (cutoff_time,)),
+                ('DELETE FROM request_log WHERE timestamp < ?', (cutoff_time,))
+            )
+            self._last_request_cache.clear()
                 
         except Exception as e:
             logger.error(f"Error cleaning up old records: {e}")
@@ -257,13 +477,8 @@ class Database:
     async def is_test_mode(self) -> bool:
         """Check if bot is in test mode"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                async with db.execute(
-                    'SELECT value FROM bot_settings WHERE key = ?',
-                    ('test_mode',)
-                ) as cursor:
-                    row = await cursor.fetchone()
-                    return row[0].lower() == 'true' if row else False
+            value = await self._get_setting('test_mode')
+            return value.lower() == 'true' if value else False
         except Exception as e:
             logger.error(f"Error checking test mode: {e}")
             return False
@@ -274,19 +489,81 @@ class Database:
             current_mode = await self.is_test_mode()
             new_mode = 'false' if current_mode else 'true'
             
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute(
-                    'UPDATE bot_settings SET value = ? WHERE key = ?',
-                    (new_mode, 'test_mode')
-                )
-                await db.commit()
+            await self._write(
+                ('UPDATE bot_settings SET value = ? WHERE key = ?', (new_mode, 'test_mode'))
+            )
+            self._settings_cache.pop('test_mode', None)
                 
             return not current_mode
         except Exception as e:
             logger.error(f"Error toggling test mode: {e}")
             return False
 
-    def close(self):
-        """Close database connection (placeholder for cleanup)"""
+    async def set_test_mode(self, enabled: bool, updated_by: int) -> bool:
+        """Turn test mode on or off"""
+        try:
+            await self._write((
+                '''INSERT OR REPLACE INTO bot_settings 
+                   (key, value, updated_at, updated_by) 
+                   VALUES (?, ?, CURRENT_TIMESTAMP, ?)''',
+                ('test_mode', 'true' if enabled else 'false', updated_by)
+            ))
+            self._settings_cache.pop('test_mode', None)
+            logger.info(f"Test mode set to {enabled} by user {updated_by}")
+            return True
+        except Exception as e:
+            logger.error(f"Error setting test mode: {e}")
+            return False
+
+    async def get_card_file_ids(self) -> dict:
+        """Get cached Telegram file_ids for card images"""
+        try:
+            async with self._read_connection() as db:
+                async with db.execute('SELECT card_name, file_id FROM card_file_ids') as cursor:
+                    return {card_name: file_id for card_name, file_id in await cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"Error getting card file_ids: {e}")
+            return {}
+
+    async def save_card_file_ids(self, file_ids: dict):
+        """Replace the stored Telegram file_ids for card images"""
+        try:
+            # Rows missing from file_ids were rejected by Telegram and must not come back on restart
+            await self._write(
+                ('DELETE FROM card_file_ids', ()),
+                *(
+                    ('INSERT INTO card_file_ids (card_name, file_id) VALUES (?, ?)', item)
+                    for item in file_ids.items()
+                )
+            )
+        except Exception as e:
+            logger.error(f"Error saving card file_ids: {e}")
+
+    async def close(self):
+        """Write pending log entries, then close the write connection and all pooled read connections"""
         logger.info("Database cleanup called")
-        pass  # aiosqlite handles connection cleanup automatically through context managers
+        # The log queue and write lock only exist once init() has run
+        if self._log_queue is not None:
+            if self._log_flusher_task is not None:
+                self._log_queue.put_nowait(None)
+                await self._log_flusher_task
+                self._log_flusher_task = None
+            else:
+                batch = []
+                while not self._log_queue.empty():
+                    batch.append(self._log_queue.get_nowait())
+                await self._write_log_batch(batch)
+
+            async with self._write_lock:
+                if self._writer is not None:
+                    await self._writer.close()
+                    self._writer = None
+
+        if self._pool is None:
+            return
+
+        while not self._pool.empty():
+            conn = self._pool.get_nowait()
+            if conn is not None:
+                await conn.close()
+        self._pool = None
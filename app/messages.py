@@ -11,8 +11,6 @@ WELCOME_MESSAGE = (
 
 # Reading process messages
 READING_START = "🔮 Я начинаю раскладывать карты…. Древняя магия Таро откроет нам свои тайны…. "
-SECOND_CARD_INTRO = "✨ Туман времени рассеивается…. Я вижу следующую карту…. "
-THIRD_CARD_INTRO = "🌟 Последняя карта готова раскрыть свой секрет…. "
 
 # Card position formats
 PAST_CARD = "🕰 <b>Прошлое:</b> {}"
@@ -24,6 +22,7 @@ INTERPRETATION_START = "🌟 Сейчас я погружаюсь в мисти
 CARDS_SILENT = "🔮 Карты хранят молчание..."
 MYSTICAL_POWERS_UNAVAILABLE = "🌌 Мистические силы временно недоступны…. 🌌"
 ORACLE_MEDITATION = "🌌 Оракул погрузился в глубокую медитацию…. 🌌"
+TEST_MODE_ACTIVE = "Тестовый режим активен. Интерпретация карт отключена."
 
 # Admin help message
 ADMIN_HELP_MESSAGE = """🛠 <b>Команды администратора:</b>
@@ -36,6 +35,19 @@ ADMIN_HELP_MESSAGE = """🛠 <b>Команды администратора:</b>
 • test - Без ожидания между запросами
 • prod - Стандартный режим с ожиданием"""
 
+# Stats command messages
+STATS_HEADER = (
+    "Статистика бота за {period_days} дней:\n\n"
+    "Всего запросов: {total_requests}\n"
+    "Уникальных пользователей: {unique_users}\n"
+    "Успешных запросов: {successful_requests}\n"
+    "Неудачных запросов: {failed_requests}\n"
+)
+STATS_TOP_USERS_TITLE = "*Самые активные пользователи:*"
+STATS_TOP_USER = "- {}: {} запросов"
+STATS_TOP_QUESTIONS_TITLE = "*Популярные вопросы:*"
+STATS_TOP_QUESTION = "- {} ({} раз)"
+
 # Closing messages
 CLOSING_MESSAGE = "🌙 Теперь картам нужен отдых…. ✨ Ты можешь вернуться позже за новым предсказанием 🔮"
 ERROR_MESSAGE = "🌑 Силы Таро временно недоступны…. Попробуйте немного позже 🌑"
@@ -54,12 +66,34 @@ def escape_html(text: str) -> str:
         text = text.replace(char, f'&{char};')
     return text
 
+# Cooldown message parts
+COOLDOWN_MESSAGE_PREFIX = "🕐 Для следующего предсказания пока недостаточно магической энергии... Вернись через "
+COOLDOWN_MESSAGE_SUFFIX = " ✨"
+
+def _plural_form(number: int, one: str, few: str, many: str) -> str:
+    """Pick the Russian plural form of a word for a number"""
+    if number % 10 == 1 and number % 100 != 11:
+        return one
+    if 2 <= number % 10 <= 4 and not 12 <= number % 100 <= 14:
+        return few
+    return many
+
+def format_minutes(minutes: int) -> str:
+    """Format a number of minutes with the matching Russian plural form"""
+    if minutes == 1:
+        return "минуту"
+    return f"{minutes} {_plural_form(minutes, 'минуту', 'минуты', 'минут')}"
+
+def format_hours(hours: int) -> str:
+    """Format a number of hours with the matching Russian plural form"""
+    if hours == 1:
+        return "час"
+    return f"{hours} {_plural_form(hours, 'час', 'часа', 'часов')}"
+
 def get_cooldown_message(minutes: int) -> str:
     """Get cooldown message with remaining time"""
-    if minutes >= 120:  # 2 hours or more
-        hours = minutes // 60
-        return f"🕐 Для следующего предсказания пока недостаточно магической энергии... Вернись через {hours} часа ✨"
-    elif minutes >= 60:  # 1-2 hours
-        return "🕐 Для следующего предсказания пока недостаточно магической энергии... Вернись через час ✨"
+    if minutes >= 60:  # An hour or more
+        remaining = format_hours(minutes // 60)
     else:  # Less than an hour
-        return f"🕐 Для следующего предсказания пока недостаточно магической энергии... Вернись через {minutes} минут ✨"
+        remaining = format_minutes(minutes)
+    return COOLDOWN_MESSAGE_PREFIX + remaining + COOLDOWN_MESSAGE_SUFFIX
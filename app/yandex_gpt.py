@@ -1,9 +1,27 @@
 from yandex_cloud_ml_sdk import YCloudML
+import asyncio
 import os
 import logging
+import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of interpretations requested from YandexGPT at once
+MAX_CONCURRENT_REQUESTS = 20
+
+# Number of interpretations kept for repeated (cards, question) pairs
+INTERPRETATION_CACHE_SIZE = 2048
+
+# Runs of punctuation and whitespace between words
+NON_WORD_RE = re.compile(r'\W+')
+
+def _normalize_question(question: str) -> str:
+    """Reduce a question to lowercase words so trivial variations share a cache entry"""
+    # Keep the whole text: questions that differ anywhere must not share an interpretation
+    return NON_WORD_RE.sub(' ', question.lower()).strip()
+
 class YandexGPTClient:
     def __init__(self):
         try:
@@ -16,12 +34,27 @@ class YandexGPTClient:
             self.sdk = YCloudML(folder_id=folder_id, auth=auth_token)
             self.model = self.sdk.models.completions('yandexgpt')
             self.model = self.model.configure(temperature=0.7)
+            # The SDK reuses its channel across calls; give the blocking calls their own
+            # bounded threads instead of competing for the loop's small default executor
+            self.executor = ThreadPoolExecutor(
+                max_workers=MAX_CONCURRENT_REQUESTS,
+                thread_name_prefix="yandex-gpt"
+            )
+            # (cards, normalized question) -> interpretation, least recently used first
+            self._cache = OrderedDict()
             logger.info("YandexGPT client initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize YandexGPT client: {e}")
             raise
 
     async def generate_interpretation(self, cards, question):
+        # Positions matter, so the cards are keyed in drawn order
+        cache_key = (tuple(cards), _normalize_question(question))
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            self._cache.move_to_end(cache_key)
+            return cached
+
         try:
             prompt = f"""Ты - опытная гадалка таро с глубоким пониманием символизма карт Таро. Твоя задача - дать глубокое, подробное и мистическое толкование расклада карт Таро.
 
@@ -63,14 +96,24 @@ class YandexGPTClient:
 
             Твои слова должны нести глубокую мудрость и помогать в понимании ситуации."""
 
-            result = self.model.run(prompt)
+            # The SDK call is blocking, keep it off the event loop
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.executor, self.model.run, prompt)
             
             # Extract text from the first alternative
             for alternative in result:
-                return alternative.text  # Access the text property of the Alternative object
+                text = alternative.text  # Access the text property of the Alternative object
+                self._cache[cache_key] = text
+                if len(self._cache) > INTERPRETATION_CACHE_SIZE:
+                    self._cache.popitem(last=False)
+                return text
                 
             return "🔮 Карты хранят молчание..."
             
         except Exception as e:
             logger.error(f"Error generating interpretation: {e}")
             return "🌌 Произошла ошибка при чтении карт..."
+
+    def close(self):
+        """Stop the worker threads used for YandexGPT requests"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -2,10 +2,13 @@
 import os
 import sys
 import signal
+import fcntl
 import subprocess
 import time
 from pathlib import Path
 import logging
+import sqlite3
+from contextlib import closing
 
 # Setup logging
 logging.basicConfig(
@@ -18,6 +21,12 @@ BOT_DIR = Path(__file__).resolve().parent
 PID_FILE = BOT_DIR / "bot.pid"
 LOCK_FILE = BOT_DIR / "bot.lock"
 VENV_PYTHON = BOT_DIR / "venv" / "bin" / "python"
+CARDS_DIR = BOT_DIR / "app" / "static" / "cards"
+DB_PATH = BOT_DIR / "data" / "tarot.db"
+
+# Telegram shows photos at up to 1280px, so larger card images are wasted bytes
+CARD_MAX_SIZE = (1280, 1280)
+CARD_JPEG_QUALITY = 82
 
 def cleanup_files():
     """Remove PID and lock files if they exist."""
@@ -99,9 +108,81 @@ def restart_bot():
     time.sleep(2)  # Wait for resources to be properly released
     start_bot()
 
+def acquire_bot_lock():
+    """Take the lock a running bot holds; return its fd, or None if the bot holds it."""
+    lock_fd = os.open(LOCK_FILE, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+    try:
+        fcntl.lockf(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(lock_fd)
+        return None
+    return lock_fd
+
+def release_bot_lock(lock_fd):
+    """Release a lock taken by acquire_bot_lock()."""
+    fcntl.lockf(lock_fd, fcntl.LOCK_UN)
+    os.close(lock_fd)
+    LOCK_FILE.unlink(missing_ok=True)
+
+def optimize_cards():
+    """Re-encode card images as compact progressive JPEGs (requires Pillow)."""
+    try:
+        from PIL import Image
+    except ImportError:
+        logger.error("Pillow is required to optimize cards: pip install Pillow")
+        return
+
+    # Hold the bot's lock while rewriting: a running bot would write the old file_ids
+    # back on shutdown, and one starting now could upload half-written images
+    lock_fd = acquire_bot_lock()
+    if lock_fd is None:
+        logger.error("Stop the bot before optimizing cards: python manage.py stop")
+        return
+
+    try:
+        total_before = total_after = 0
+        for path in sorted(CARDS_DIR.glob("*.jpg")):
+            before = path.stat().st_size
+            tmp_path = path.with_suffix(".tmp")
+            try:
+                with Image.open(path) as image:
+                    image = image.convert("RGB")
+                    image.thumbnail(CARD_MAX_SIZE, Image.LANCZOS)
+                    image.save(tmp_path, "JPEG", quality=CARD_JPEG_QUALITY, optimize=True, progressive=True)
+                after = tmp_path.stat().st_size
+                if after < before:
+                    tmp_path.replace(path)
+                else:
+                    tmp_path.unlink()
+                    after = before
+            except Exception as e:
+                logger.error(f"Error optimizing {path.name}: {e}")
+                tmp_path.unlink(missing_ok=True)
+                after = before
+
+            total_before += before
+            total_after += after
+            logger.info(f"{path.name}: {before} -> {after} bytes")
+
+        logger.info(f"Card images: {total_before} -> {total_after} bytes")
+
+        # Cached file_ids point at the old uploads; drop them so the new images get sent
+        if DB_PATH.exists():
+            try:
+                with closing(sqlite3.connect(DB_PATH)) as conn, conn:
+                    conn.execute("DELETE FROM card_file_ids")
+            except sqlite3.OperationalError as e:
+                # The table only exists once the bot has run with this database
+                logger.info(f"No cached card file_ids to clear: {e}")
+            else:
+                logger.info("Cleared cached card file_ids, the new images are uploaded on the next start")
+    finally:
+        release_bot_lock(lock_fd)
+
 def main():
-    if len(sys.argv) != 2 or sys.argv[1] not in ['start', 'stop', 'restart']:
-        print("Usage: python manage.py [start|stop|restart]")
+    commands = ['start', 'stop', 'restart', 'optimize_cards']
+    if len(sys.argv) != 2 or sys.argv[1] not in commands:
+        print("Usage: python manage.py [start|stop|restart|optimize_cards]")
         return
 
     command = sys.argv[1]
@@ -111,6 +192,8 @@ def main():
         stop_bot()
     elif command == 'restart':
         restart_bot()
+    elif command == 'optimize_cards':
+        optimize_cards()
 
 if __name__ == '__main__':
     main()